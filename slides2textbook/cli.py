@@ -13,14 +13,30 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--no-md", dest="save_md", action="store_false", help="Skip saving the markdown file")
     parser.add_argument("--no-pdf", dest="make_pdf", action="store_false", help="Skip saving the pdf file")
     parser.add_argument("--no-epub", dest="make_epub", action="store_false", help="Skip saving the epub file")
+    parser.add_argument("--no-validate", dest="validate", action="store_false", help="Skip validating generated chapters and repairing faulty sections")
+    parser.add_argument("--preview", action="store_true", help="Quickly generate and export a draft of every chapter in parallel first, then upgrade each chapter at full quality, re-exporting as each one completes.")
+    parser.add_argument("--preview-model", type=str, default=None, help="Model used for draft chapters in --preview mode (defaults to -m). A cheap, fast model is recommended. Format: '<provider>/<model>'.")
+    parser.add_argument("--preview-effort", type=str, default="low", help="Reasoning effort used for draft chapters in --preview mode.")
+    parser.add_argument("--watch", action="store_true", help="After building, keep running and rebuild only the chapters whose input files change.")
+    parser.add_argument("--watch-interval", type=float, default=2.0, help="Seconds between checks for changed input files in --watch mode.")
+    parser.add_argument("--plan", action="store_true", help="Estimate tokens, cost and time for the run without calling any API, then exit.")
     parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity (use -vv for more)")
     parser.add_argument("-q", "--quiet", action="count", default=0, help="Decrease verbosity (use -qq to silence info)")
     parser.add_argument("-m", "--model", type=str, default="openai/gpt-5.4", help="Specify which provider and model will be used in the format of '<provider>/<model>' for example 'openai/gpt-5.4'. Defaults to included API keys. Providers are, 'openai', 'gemini' and 'anthropic'. Anthropic is not yet supported.")
     parser.add_argument("--vision-model", type=str, default=None, help="Override the model used for image transcription (defaults to -m). Format: '<provider>/<model>'.")
     parser.add_argument("-e", "--effort", type=str, default=None, help="The reasoning effort that will be used for the model, only supported by some models.")
+    parser.add_argument("--max-connections", type=positive_int, default=20, help="Maximum number of pooled HTTP connections shared by the API clients.")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Timeout in seconds for a single API request.")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 for API requests (requires 'pip install httpx[http2]').")
     parser.add_argument("--log-file", type=Path, default=None, help="Optional path to write logs (in addition to stderr).")
     return parser
 
+def positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return n
+
 def existing_file(path_str: str) -> Path:
     p = Path(path_str)
     if not p.is_file():
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import os
 import re
@@ -9,30 +10,52 @@ from slides2textbook import llm_tools
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_SUFFIXES = {".pdf", ".txt", ".md", ".json", ".html", ".png", ".jpg", ".jpeg"}
+
 def _natural_key(value: str) -> list[object]:
     parts = re.split(r"(\d+)", value)
     return [int(part) if part.isdigit() else part.lower() for part in parts]
 
+def is_context_file(path: Path) -> bool:
+    """
+    Return whether a file can be loaded as context. Editor lock and swap files such as
+    "~$deck.pptx", ".#notes.md" or ".notes.md.swp" are never context.
+    """
+    return path.suffix in SUPPORTED_SUFFIXES and not path.name.startswith(("~$", ".#"))
+
+def list_chapter_files(path: Path, skip_unsupported: bool = False) -> list[list[Path]]:
+    """
+    Return the files that make up each chapter, in chapter order, without loading them.
+    Uses the same grouping as load_main_directory. With skip_unsupported, files that are not
+    context (see is_context_file) are left out instead of aborting the load later, as watch
+    mode must survive the temporary files editors create next to the slides.
+    """
+    dirs = sorted((p for p in path.iterdir() if p.is_dir()), key=lambda p: _natural_key(p.name))
+
+    if dirs:
+        chapters = [directory_files(chapter_dir) for chapter_dir in dirs]
+    else:
+        chapters = directory_chapter_files(path)
+
+    if skip_unsupported:
+        chapters = [kept for kept in ([file for file in files if is_context_file(file)] for files in chapters) if kept]
+    return chapters
+
 def load_main_directory(path: Path, *, vision_model: str = "openai/gpt-5.4") -> list[str]:
     """
     Load all the subdirectories and their files as their respective chapter context. 
     Each chapter context is created based on the context held within each chapter directory in alphabetic order.
     """
     logger.info(f"Loading main directory at Path: {str(path)}")
-    dirs = sorted((p for p in path.iterdir() if p.is_dir()), key=lambda p: _natural_key(p.name))
+    chapters = [load_context(files, vision_model=vision_model) for files in list_chapter_files(path)]
 
-    if dirs:
-        return [load_directory(chapter_context, vision_model=vision_model) for chapter_context in dirs]
-        
-    chapters = load_directory_chapters(path, vision_model=vision_model)
     if len(chapters) < 1:
         logger.error("No context loaded. Aborting program.")
     return chapters
 
-
-def load_directory_chapters(path: Path, *, vision_model: str = "openai/gpt-5.4") -> list[str]:
+def directory_chapter_files(path: Path) -> list[list[Path]]:
     """
-    Load directory as textbook context where each set of files that share the same basename is considered a seperate chapter context.
+    Group the files of a directory into chapters, where each set of files that share the same basename is a chapter.
     """
     files = sorted(
         (
@@ -46,9 +69,6 @@ def load_directory_chapters(path: Path, *, vision_model: str = "openai/gpt-5.4")
         ),
     )
 
-    if not files:
-        return []
-
     chapters: list[list[Path]] = []
     current: list[Path] = []
 
@@ -61,13 +81,19 @@ def load_directory_chapters(path: Path, *, vision_model: str = "openai/gpt-5.4")
     if current:
         chapters.append(current)
 
-    return [load_context(chapter, vision_model=vision_model) for chapter in chapters]
+    return chapters
 
-def load_directory(path: Path, *, vision_model: str = "openai/gpt-5.4") -> str:
+def load_directory_chapters(path: Path, *, vision_model: str = "openai/gpt-5.4") -> list[str]:
     """
-    Load directory as chapter context, recursive inclusion of subdirectories, sorted by relative folder, then filename.
+    Load directory as textbook context where each set of files that share the same basename is considered a seperate chapter context.
     """
-    files = sorted(
+    return [load_context(chapter, vision_model=vision_model) for chapter in directory_chapter_files(path)]
+
+def directory_files(path: Path) -> list[Path]:
+    """
+    List the files of a chapter directory, recursive inclusion of subdirectories, sorted by relative folder, then filename.
+    """
+    return sorted(
         (p for p in path.rglob("*") if p.is_file()),
         key=lambda p: (
             _natural_key(p.relative_to(path).parent.as_posix()),
@@ -75,7 +101,11 @@ def load_directory(path: Path, *, vision_model: str = "openai/gpt-5.4") -> str:
         ),
     )
 
-    return load_context(files, vision_model=vision_model)
+def load_directory(path: Path, *, vision_model: str = "openai/gpt-5.4") -> str:
+    """
+    Load directory as chapter context, recursive inclusion of subdirectories, sorted by relative folder, then filename.
+    """
+    return load_context(directory_files(path), vision_model=vision_model)
 
 def load_context(paths: list[Path] | Path, return_instructions: bool = False, *, vision_model: str = "openai/gpt-5.4") -> str:
     """ 
@@ -94,7 +124,7 @@ def load_context(paths: list[Path] | Path, return_instructions: bool = False, *,
         key = file.relative_to(base_path).as_posix()
         match file.suffix:
             case ".pdf":
-                context_dict[key] = pdf_decoder.to_md(file)
+                context_dict[key] = pdf_decoder.iter_pages(file) # Streamed into the context by context_formatter.
             case ".txt" | ".md" | ".json" | ".html": # TODO: A lot more, if this is the approach we are taking.
                 context_dict[key] = load_textfile(file)
             case ".png" | ".jpg" | ".jpeg":
@@ -113,12 +143,19 @@ def load_instructions(path: Path) -> str:
 
 def context_formatter(context_dict):
     """
-    Converts a dictionary of key and file text pairs into a LLM readable format.
+    Converts a dictionary of key and file text pairs into a LLM readable format. A value may also
+    be an iterable of text chunks, such as the pages of a PDF, which are joined without an
+    intermediate copy of the whole file.
     """
-    context = ""
+    parts: list[str] = []
     for key, value in context_dict.items():
-        context += f"{key}:\n{value}\n\n"
-    return context
+        parts.append(f"{key}:\n")
+        if isinstance(value, str):
+            parts.append(value)
+        else:
+            parts.extend(value)
+        parts.append("\n\n")
+    return "".join(parts)
 
 def load_textfile(path: Path, encoding="utf-8") -> str:
     """ 
@@ -140,13 +177,21 @@ IMAGE_TO_TEXT_PROMPT = (
     "Use markdown and LaTeX (\\( \\) for inline, \\[ \\] for display) for mathematical notation."
 )
 
+_image_cache: dict[tuple[str, str], str] = {}
+
 def load_image(path: Path, model_str: str = "openai/gpt-5.4") -> str:
     """
     Load an image and transcribe it using LLMs. Effort is always None
     because image transcription is a mechanical task that doesn't
-    benefit from reasoning.
+    benefit from reasoning. Transcriptions are kept in memory by image
+    content, so an unchanged image is only transcribed once per process.
     """
+    key = (hashlib.sha256(path.read_bytes()).hexdigest(), model_str)
+    if key in _image_cache:
+        logger.info(f"Reusing transcription of unchanged image at path={str(path)}.")
+        return _image_cache[key]
     response = llm_tools.image_analysis(IMAGE_TO_TEXT_PROMPT, path, model_str, effort=None)
     logger.info(f"Finished transcribing image at path={str(path)} with model={model_str}.")
     logger.info(str(response.token_count))
+    _image_cache[key] = response.output_text
     return response.output_text
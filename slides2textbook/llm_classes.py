@@ -5,6 +5,8 @@ from openai.types.responses import ResponseUsage
 
 from enum import Enum
 
+# Chapters drafted concurrently by --preview, shared by the pipeline and the planner's estimate.
+PREVIEW_WORKERS = 8
 
 class ModelProvider(Enum):
     OPENAI = "openai"
@@ -67,6 +69,20 @@ class TokenCount:
         return f"(Input Tokens: {self.input_tokens}, Cached Tokens: {self.cached_tokens}, Output Tokens: {self.output_tokens}, Reasoning Tokens: {self.reasoning_tokens}, Total Tokens: {self.total_tokens})"
 
 
+@dataclass
+class TransportConfig:
+    """
+    HTTP transport settings shared by all provider clients. Timeouts are in seconds.
+    """
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 60.0
+    connect_timeout: float = 10.0
+    request_timeout: float = 600.0
+    upload_seconds_per_mb: float = 5.0
+    http2: bool = False
+
+
 class LLM_Response:
     """
     Container to cleanly return an LLM Response.
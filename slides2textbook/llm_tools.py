@@ -9,6 +9,7 @@ from enum import Enum
 from pathlib import Path
 from typing import NoReturn, Optional
 
+import httpx
 from dotenv import load_dotenv
 from google.genai.client import Client
 from google.genai import types
@@ -17,7 +18,7 @@ from openai.types.responses import Response, ResponseUsage
 
 from google import genai
 
-from slides2textbook.llm_classes import LLM_Response, TokenCount
+from slides2textbook.llm_classes import LLM_Response, TokenCount, TransportConfig
 from slides2textbook.llm_classes import ModelProvider
 
 logger = logging.getLogger(__name__)
@@ -28,13 +29,64 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 
+_transport_config = TransportConfig()
+
+def configure_transport(config: TransportConfig) -> None:
+    """Set the transport used by all provider clients. Clients are rebuilt on next use."""
+    global _transport_config
+    _transport_config = config
+    _http_client.cache_clear()
+    _openai_client.cache_clear()
+    _gemini_client.cache_clear()
+
+def _timeout(payload_bytes: int = 0) -> httpx.Timeout:
+    """Per-call timeout. The write timeout grows with the payload so large base64 uploads are not cut off."""
+    config = _transport_config
+    write = max(config.connect_timeout, payload_bytes / 1_000_000 * config.upload_seconds_per_mb)
+    return httpx.Timeout(config.request_timeout, connect=config.connect_timeout, write=write)
+
+def _timeout_ms(payload_bytes: int = 0) -> int:
+    """
+    Per-call timeout for google-genai, which takes a single timeout in milliseconds for every
+    phase of a request. Uses the longer of the request timeout and the payload-scaled write timeout.
+    """
+    timeout = _timeout(payload_bytes)
+    return int(max(timeout.read, timeout.write) * 1000)
+
+@lru_cache(maxsize=1)
+def _http_client() -> httpx.Client:
+    """A single pooled httpx client shared by every provider so connections are kept alive and reused."""
+    config = _transport_config
+    http2 = config.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed (pip install httpx[http2]). Using HTTP/1.1.")
+            http2 = False
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        timeout=_timeout(),
+        http2=http2,
+    )
+
 @lru_cache(maxsize=1)
 def _openai_client() -> OpenAI:
-    return OpenAI(api_key=OPENAI_API_KEY, max_retries=3)
+    return OpenAI(api_key=OPENAI_API_KEY, max_retries=3, http_client=_http_client())
 
 @lru_cache(maxsize=1)
 def _gemini_client() -> Client:
-    return genai.Client(api_key=GEMINI_API_KEY)
+    return genai.Client(
+        api_key=GEMINI_API_KEY,
+        http_options=types.HttpOptions(
+            timeout=_timeout_ms(),
+            httpx_client=_http_client(),
+        ),
+    )
 
 @lru_cache(maxsize=1)
 def _anthropic_client() -> NoReturn:
@@ -74,6 +126,7 @@ def generate_openai(developer: str, user: str, model: str = "gpt-5.4", effort: O
         reasoning={"effort": effort}, # effort of value None does not fail API.
         instructions=developer,
         input=user,
+        timeout=_timeout(len(developer.encode("utf-8")) + len(user.encode("utf-8"))),
     )
 
     token_count = TokenCount()
@@ -110,6 +163,7 @@ def generate_gemini(developer: str, user: str, model: str = "gemini-3.0-flash",
         config=types.GenerateContentConfig(
             system_instruction=developer,
             thinking_config=thinking_config,
+            http_options=types.HttpOptions(timeout=_timeout_ms(len(developer.encode("utf-8")) + len(user.encode("utf-8")))),
         ),
     )
 
@@ -194,6 +248,7 @@ def openai_image_analysis(instruction: str, image_path: str | Path, model: str =
                 ],
             }
         ],
+        timeout=_timeout(len(base64_image)),
     )
 
     token_count = TokenCount()
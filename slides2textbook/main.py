@@ -1,4 +1,5 @@
 import logging
+import threading
 from pathlib import Path
 
 from slides2textbook import cli
@@ -12,6 +13,31 @@ def main(argv: list[str] | None = None) -> None:
     logconfig.configure_logging(args.verbose, args.quiet, args.log_file)
     name = cli.resolve_output_name(args)
 
+    if args.plan:
+        from slides2textbook import planner
+
+        plans = planner.plan_run(args.context_path, args.out_dir)
+        print(planner.format_plan(
+            plans,
+            args.model,
+            args.vision_model or args.model,
+            effort=args.effort,
+            preview=args.preview,
+            preview_model=args.preview_model,
+            preview_effort=args.preview_effort,
+            validate=args.validate,
+        ))
+        return
+
+    configure_transport(args)
+
+    if args.watch:
+        from slides2textbook import context_loader, watcher
+
+        # Taken before the first build so edits made while it runs are rebuilt afterwards.
+        watch_state = watcher.snapshot(args.context_path, args.out_dir)
+        watch_chapters = context_loader.list_chapter_files(args.context_path, skip_unsupported=True)
+
     try:
         run_pipeline(
             path=args.context_path,
@@ -23,11 +49,42 @@ def main(argv: list[str] | None = None) -> None:
             model=args.model,
             effort = args.effort,
             vision_model=args.vision_model or args.model,
+            validate=args.validate,
+            preview=args.preview,
+            preview_model=args.preview_model,
+            preview_effort=args.preview_effort,
         )
+        if args.watch:
+            watcher.watch(
+                path=args.context_path,
+                out_dir=args.out_dir,
+                name=name,
+                save_md=args.save_md,
+                make_pdf=args.make_pdf,
+                make_epub=args.make_epub,
+                model=args.model,
+                effort=args.effort,
+                vision_model=args.vision_model or args.model,
+                validate=args.validate,
+                interval=args.watch_interval,
+                state=watch_state,
+                chapters=watch_chapters,
+            )
     except Exception:
         logger.exception("Unhandled error while running Slides2Textbook pipeline")
         raise SystemExit(1)
 
+def configure_transport(args) -> None:
+    from slides2textbook import llm_tools
+    from slides2textbook.llm_classes import TransportConfig
+
+    llm_tools.configure_transport(TransportConfig(
+        max_connections=args.max_connections,
+        max_keepalive_connections=args.max_connections,
+        request_timeout=args.timeout,
+        http2=args.http2,
+    ))
+
 def run_pipeline(
     path: Path,
     out_dir: Path,
@@ -38,9 +95,12 @@ def run_pipeline(
     model: str,
     effort: str,
     vision_model: str = "openai/gpt-5.4",
+    validate: bool = True,
+    preview: bool = False,
+    preview_model: str | None = None,
+    preview_effort: str | None = "low",
 ) -> None:
     from slides2textbook import context_loader, llm_tools, md_helper, prompt_builder as pb
-    from slides2textbook.llm_classes import LLM_Response
 
     out_dir.mkdir(parents=True, exist_ok=True)
 
@@ -65,33 +125,128 @@ def run_pipeline(
     system_prompt = pb.build_system_prompt()
     textbook: list[str] = []
 
-    for idx, chapter_context in enumerate(loaded_context):
-        path = out_dir / "chapters" / f"chapter-{str(idx + 1)}.md"
-        if Path.is_file(path):
-            logger.info(f"A chapter in {out_dir}/chapters with the name 'chapter-{str(idx + 1)}' already exists. Skipping LLM call and using existing chapter.")
-            textbook.append(context_loader.load_textfile(path))
-            continue
-        logger.info("Generating chapter with context: " + chapter_context[:100].strip('\n') + "...")
-        chapter_prompt = get_chapter_context(
-            chapter_context,
-            instructions,
-            idx,
-            textbook,
-            name,
-        )
-        response: LLM_Response = llm_tools.generate(system_prompt, chapter_prompt, model_str=model, effort=effort)
-        textbook.append(response.output_text)
-        token_count.add(response.token_count)
-        logger.info("Finished generating chapter: " + response.output_text[:100].strip('\n') + "...")
-        md_helper.save_md(response.output_text, out_dir / "chapters", "chapter-" + str(idx + 1))
+    # Exports run in the background in preview mode so generation is never blocked on LaTeX.
+    exporter = BackgroundExporter(out_dir, name, save_md, make_pdf, make_epub) if preview else None
+    try:
+        if preview:
+            textbook = generate_drafts(
+                loaded_context,
+                instructions,
+                out_dir,
+                name,
+                system_prompt,
+                model=preview_model or model,
+                effort=preview_effort,
+                token_count=token_count,
+            )
+            exporter.submit(textbook)
+            logger.info(f"Exporting draft textbook to {out_dir}/{name}, now upgrading chapters at full quality.")
+
+        for idx, chapter_context in enumerate(loaded_context):
+            path = out_dir / "chapters" / f"chapter-{str(idx + 1)}.md"
+            if Path.is_file(path):
+                logger.info(f"A chapter in {out_dir}/chapters with the name 'chapter-{str(idx + 1)}' already exists. Skipping LLM call and using existing chapter.")
+                if not preview:
+                    textbook.append(context_loader.load_textfile(path))
+                continue
+            logger.info("Generating chapter with context: " + chapter_context[:100].strip('\n') + "...")
+            chapter_prompt = get_chapter_context(
+                chapter_context,
+                instructions,
+                idx,
+                textbook,
+                name,
+            )
+            chapter, chapter_token_count = generate_chapter(system_prompt, chapter_prompt, idx, model, effort, validate)
+            token_count.add(chapter_token_count)
+            logger.info("Finished generating chapter: " + chapter[:100].strip('\n') + "...")
+            md_helper.save_md(chapter, out_dir / "chapters", "chapter-" + str(idx + 1))
+            if preview:
+                textbook[idx] = chapter
+                exporter.submit(textbook)
+                logger.info(f"Replaced draft of chapter {idx + 1} and queued a re-export of the textbook.")
+            else:
+                textbook.append(chapter)
+    finally:
+        if exporter:
+            exporter.close()
 
     logger.info(f"Converted slides to longform textbook.")
     logger.info(token_count)
 
-    # Combine chapters into textbook string with spacing before each chapter
-    textbook_str = "".join(f"\n\n{chapter}" for chapter in textbook)
-    
-    save_files(textbook_str, out_dir, name, save_md, make_pdf, make_epub)
+    if not preview:
+        save_files(textbook, out_dir, name, save_md, make_pdf, make_epub)
+
+def generate_chapter(
+    system_prompt: str,
+    chapter_prompt: str,
+    idx: int,
+    model: str,
+    effort: str,
+    validate: bool = True,
+):
+    """
+    Generate a single chapter, repairing faulty sections when validate is set.
+    Returns the chapter and the tokens spent generating it.
+    """
+    from slides2textbook import llm_tools, md_validator
+
+    token_count = llm_tools.TokenCount()
+    response = llm_tools.generate(system_prompt, chapter_prompt, model_str=model, effort=effort)
+    token_count.add(response.token_count)
+    chapter = response.output_text
+    if validate:
+        issues = md_validator.validate_chapter(chapter, is_first=idx == 0)
+        if issues:
+            logger.info(f"Found {len(issues)} issue(s) in chapter {idx + 1}, repairing affected sections.")
+            chapter, repair_token_count = md_validator.repair_chapter(chapter, issues, model_str=model, effort=effort, is_first=idx == 0)
+            token_count.add(repair_token_count)
+    return chapter, token_count
+
+def generate_drafts(
+    loaded_context: list[str],
+    instructions: str,
+    out_dir: Path,
+    name: str,
+    system_prompt: str,
+    model: str,
+    effort: str,
+    token_count,
+) -> list[str]:
+    """
+    Generate a quick draft of every chapter in parallel. Drafts do not see the previous chapter
+    so they can all be generated at once, and are saved to out_dir/drafts. Chapters that already
+    have a full quality version in out_dir/chapters use that instead.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from slides2textbook import context_loader, md_helper
+    from slides2textbook.llm_classes import PREVIEW_WORKERS
+
+    drafts: list[str | None] = [None] * len(loaded_context)
+    pending: list[int] = []
+    for idx in range(len(loaded_context)):
+        for directory in ("chapters", "drafts"):
+            path = out_dir / directory / f"chapter-{idx + 1}.md"
+            if path.is_file():
+                drafts[idx] = context_loader.load_textfile(path)
+                break
+        else:
+            pending.append(idx)
+
+    logger.info(f"Generating drafts of {len(pending)} chapters with model={model} effort={effort}.")
+
+    def draft(idx: int):
+        prompt = get_chapter_context(loaded_context[idx], instructions, idx, None, name)
+        return generate_chapter(system_prompt, prompt, idx, model, effort, validate=False)
+
+    with ThreadPoolExecutor(max_workers=PREVIEW_WORKERS) as executor:
+        for idx, (chapter, chapter_token_count) in zip(pending, executor.map(draft, pending)):
+            token_count.add(chapter_token_count)
+            md_helper.save_md(chapter, out_dir / "drafts", f"chapter-{idx + 1}")
+            drafts[idx] = chapter
+
+    return drafts
 
 def get_chapter_context(
     chapter_context: str,
@@ -110,7 +265,7 @@ def get_chapter_context(
     if textbook_idx > 0 and textbook:
         parts.append("Previous chapter:\n")
         parts.append(textbook[textbook_idx - 1])
-    else:
+    elif textbook_idx == 0:
         parts.append(
             "You are now generating the first chapter of the textbook. "
             "Make sure to include the title of the book. (# Title)"
@@ -126,23 +281,69 @@ def get_chapter_context(
 
     return "".join(parts)
 
-def save_files(textbook_str: str, out_dir: Path, name: str, save_md: bool = True, make_pdf: bool = True, make_epub: bool = True):
+def save_files(textbook: list[str], out_dir: Path, name: str, save_md: bool = True, make_pdf: bool = True, make_epub: bool = True):
     """
-    Function to simplify run_pipeline.
+    Function to simplify run_pipeline. The markdown is parsed once for both PDF and EPUB, with
+    math pre-validated so broken formulas are isolated before the LaTeX build.
     """
     from slides2textbook import md_helper
 
+    textbook_str = md_helper.join_chapters(textbook)
+
     if save_md:
         md_helper.save_md(textbook_str, out_dir, name)
         logger.info(f"Saved markdown to {out_dir}/{name}")
+
+    if make_pdf or make_epub:
+        ast = md_helper.chapters_to_ast(textbook)
+
     if make_pdf:
-        md_helper.md_to_pdf(textbook_str, out_dir, name)
+        md_helper.md_to_pdf(textbook_str, out_dir, name, ast=ast, chapters=textbook)
         logger.info(f"Saved PDF to {out_dir}/{name}")
     if make_epub:
-        md_helper.md_to_epub(textbook_str, out_dir, name)
+        md_helper.md_to_epub(textbook_str, out_dir, name, ast=ast)
         logger.info(f"Saved EPUB to {out_dir}/{name}")
     if not save_md and not make_pdf:
         logger.warning("Nothing saved as both --no-md and --no-pdf flags were set. ")
 
+class BackgroundExporter:
+    """
+    Runs save_files on a single background thread. Queued textbooks collapse so only the
+    newest one is exported once the current export finishes.
+    """
+    def __init__(self, out_dir: Path, name: str, save_md: bool = True, make_pdf: bool = True, make_epub: bool = True):
+        self._args = (out_dir, name, save_md, make_pdf, make_epub)
+        self._condition = threading.Condition()
+        self._pending: list[str] | None = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, textbook: list[str]) -> None:
+        """Queue a copy of textbook for export, replacing any export still waiting."""
+        with self._condition:
+            self._pending = list(textbook)
+            self._condition.notify()
+
+    def close(self) -> None:
+        """Wait for the newest queued textbook to be exported and stop the worker."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                textbook, self._pending = self._pending, None
+            try:
+                save_files(textbook, *self._args)
+            except Exception:
+                logger.exception("Failed to export textbook in the background.")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
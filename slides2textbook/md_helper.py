@@ -2,15 +2,22 @@
 Module for saving and converting Markdown data.
 """
 
+import itertools
+import json
 import logging
+import re
+import shutil
 import tempfile
 from pathlib import Path
 
+import pymupdf
 import pypandoc
 from markdown_pdf import MarkdownPdf, Section
 
 logger = logging.getLogger(__name__)
 
+PANDOC_MD_FORMAT = "markdown+tex_math_single_backslash+tex_math_dollars"
+
 def save_md(md: str, out_dir: Path, name: str) -> None:
     """
     Saves the provided markdown data to out_dir/name.md
@@ -45,13 +52,183 @@ _LATEX_PREAMBLE = r"""
 \setlist[enumerate,9]{label=\roman*.}
 """
 
-def _md_to_pdf_pandoc(md: str, out_path: Path, toc: bool) -> None:
-    """Converts md string to PDF via pandoc (requires a TeX engine on PATH)."""
+def join_chapters(chapters: list[str]) -> str:
+    """Combine chapters into a single markdown string with spacing before each chapter."""
+    return "".join(f"\n\n{chapter}" for chapter in chapters)
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_INLINE_CODE_RE = re.compile(r"`[^`\n]*`")
+# Inline $...$ math as pandoc's tex_math_dollars reads it: the opening $ is followed and the closing $
+# preceded by a non-space character, the closing $ is not followed by a digit (so "$20 and $30" is
+# not math), escaped \$ is not a delimiter, and the formula does not span a blank line.
+_INLINE_DOLLAR_MATH = r"(?<![\\$])\$(?![$\s])((?:\\.|[^$\\\n]|\n(?![ \t]*\n))+?)(?<!\s)\$(?![$\d])"
+_MATH_RE = re.compile(
+    r"\$\$(.+?)\$\$|(?<!\\)\\\[(.+?)(?<!\\)\\\]|(?<!\\)\\\((.+?)(?<!\\)\\\)|" + _INLINE_DOLLAR_MATH,
+    re.DOTALL,
+)
+# Math delimiters, ignoring LaTeX line breaks such as "\\[2pt]" which are preceded by another backslash.
+_DELIMITER_RES = {
+    delimiter: re.compile(r"(?<!\\)" + re.escape(delimiter))
+    for delimiter in ("\\[", "\\]", "\\(", "\\)")
+}
+_ENV_RE = re.compile(r"\\(begin|end)\{([^}]*)\}")
+
+def _strip_code(md: str) -> str:
+    """Remove fenced code blocks and inline code so they are not checked as prose or math."""
+    kept: list[str] = []
+    in_fence = False
+    for line in md.splitlines(keepends=True):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+            continue
+        if not in_fence:
+            kept.append(_INLINE_CODE_RE.sub("", line))
+    return "".join(kept)
+
+def _environment_problems(tex: str) -> list[str]:
+    stack: list[str] = []
+    for kind, env in _ENV_RE.findall(tex):
+        if kind == "begin":
+            stack.append(env)
+        elif not stack or stack.pop() != env:
+            return [f"Mismatched \\end{{{env}}}."]
+    if stack:
+        return [f"Unclosed \\begin{{{stack[-1]}}}."]
+    return []
+
+def formula_problems(formula: str) -> list[str]:
+    """Return descriptions of unbalanced braces or environments in a single formula."""
+    problems: list[str] = []
+    unescaped = formula.replace("\\{", "").replace("\\}", "")
+    if unescaped.count("{") != unescaped.count("}"):
+        problems.append(f"Unbalanced braces in formula: {formula.strip()[:80]}")
+    problems.extend(_environment_problems(formula))
+    return problems
+
+def math_problems(md: str) -> list[str]:
+    """Return descriptions of unbalanced math delimiters, braces or environments in markdown."""
+    problems: list[str] = []
+    text = _strip_code(md)
+
+    if text.count("$$") % 2:
+        problems.append("Unbalanced '$$' display math delimiters.")
+    for opening, closing in (("\\[", "\\]"), ("\\(", "\\)")):
+        if len(_DELIMITER_RES[opening].findall(text)) != len(_DELIMITER_RES[closing].findall(text)):
+            problems.append(f"Unbalanced '{opening}' and '{closing}' math delimiters.")
+
+    for match in _MATH_RE.finditer(text):
+        formula = next(group for group in match.groups() if group is not None)
+        problems.extend(formula_problems(formula))
+
+    problems.extend(_environment_problems(_MATH_RE.sub("", text)))
+    return problems
+
+def _isolate_broken_tex(node) -> int:
+    """
+    Replace Math and raw TeX nodes of a pandoc JSON AST whose TeX would not compile with
+    inline code, so only the offending fragment is shown as literal text. Returns the count.
+    """
+    isolated = 0
+    if isinstance(node, dict):
+        for value in node.values():
+            isolated += _isolate_broken_tex(value)
+    elif isinstance(node, list):
+        for idx, child in enumerate(node):
+            if not isinstance(child, dict):
+                isolated += _isolate_broken_tex(child)
+                continue
+            match child.get("t"):
+                case "Math" if formula_problems(child["c"][1]):
+                    math_type, formula = child["c"]
+                    delimiter = "$$" if math_type["t"] == "DisplayMath" else "$"
+                    node[idx] = {"t": "Code", "c": [["", [], []], f"{delimiter}{formula}{delimiter}"]}
+                    isolated += 1
+                case "RawInline" if child["c"][0] in ("tex", "latex") and formula_problems(child["c"][1]):
+                    node[idx] = {"t": "Code", "c": [["", [], []], child["c"][1]]}
+                    isolated += 1
+                case "RawBlock" if child["c"][0] in ("tex", "latex") and formula_problems(child["c"][1]):
+                    node[idx] = {"t": "CodeBlock", "c": [["", [], []], child["c"][1]]}
+                    isolated += 1
+                case _:
+                    isolated += _isolate_broken_tex(child)
+    return isolated
+
+def _iter_nodes(node, kind: str):
+    """Yield every element of a pandoc JSON AST of the given type, e.g. "Header"."""
+    if isinstance(node, dict):
+        if node.get("t") == kind:
+            yield node
+        for value in node.values():
+            yield from _iter_nodes(value, kind)
+    elif isinstance(node, list):
+        for child in node:
+            yield from _iter_nodes(child, kind)
+
+def _unique_header_ids(blocks: list, seen: set[str]) -> None:
+    """
+    Rename the header identifiers of blocks parsed on their own that are already in seen, the way
+    pandoc numbers duplicates (id-1, id-2, ...), and point internal links within blocks at the new
+    identifiers. Adds the final identifiers to seen.
+    """
+    renamed: dict[str, str] = {}
+    for header in _iter_nodes(blocks, "Header"):
+        attr = header["c"][1]
+        identifier = attr[0]
+        if identifier in seen:
+            number = 1
+            while f"{identifier}-{number}" in seen:
+                number += 1
+            attr[0] = renamed[identifier] = f"{identifier}-{number}"
+        if attr[0]:
+            seen.add(attr[0])
+    for link in _iter_nodes(blocks, "Link"):
+        target = link["c"][2]
+        if target[0].startswith("#") and target[0][1:] in renamed:
+            target[0] = "#" + renamed[target[0][1:]]
+
+def chapters_to_ast(chapters: list[str]) -> str:
+    """
+    Parses the chapters into a single pandoc JSON AST. The AST can be passed to md_to_pdf and
+    md_to_epub so the markdown is only parsed once for every export format.
+
+    Math is validated first: chapters with unbalanced math delimiters are parsed without
+    raw_tex so stray TeX stays literal text, and each formula or raw TeX fragment that would
+    not compile is replaced by inline code. Valid math is left untouched. As each run of chapters
+    is parsed separately, header identifiers are made unique across runs when merging.
+    """
+    doc: dict | None = None
+    blocks: list = []
+    header_ids: set[str] = set()
+    for broken, group in itertools.groupby(chapters, key=lambda chapter: bool(math_problems(chapter))):
+        md_format = PANDOC_MD_FORMAT + "-raw_tex" if broken else PANDOC_MD_FORMAT
+        part = json.loads(pypandoc.convert_text(join_chapters(list(group)), "json", format=md_format))
+        doc = doc or part
+        _unique_header_ids(part["blocks"], header_ids)
+        blocks.extend(part["blocks"])
+
+    if doc is None:
+        return pypandoc.convert_text("", "json", format=PANDOC_MD_FORMAT)
+    doc["blocks"] = blocks
+    isolated = _isolate_broken_tex(doc["blocks"])
+    if isolated:
+        logger.warning(f"Rendering {isolated} broken math fragment(s) as literal text.")
+    return json.dumps(doc)
+
+def _md_to_pdf_pandoc(md: str, out_path: Path, toc: bool, ast: str | None = None, start_page: int = 1) -> None:
+    """
+    Converts md string (or its pre-parsed AST) to PDF via pandoc (requires a TeX engine on PATH).
+    Page numbering starts at start_page, so separately built chapters can be merged into one book.
+    """
     with tempfile.NamedTemporaryFile(
         mode="w", suffix=".tex", delete=False, encoding="utf-8"
     ) as hdr:
         hdr.write(_LATEX_PREAMBLE)
         hdr_path = hdr.name
+    with tempfile.NamedTemporaryFile(
+        mode="w", suffix=".tex", delete=False, encoding="utf-8"
+    ) as before:
+        before.write(f"\\setcounter{{page}}{{{start_page}}}\n")
+        before_path = before.name
 
     extra_args = [
         "--pdf-engine=xelatex",
@@ -60,20 +237,22 @@ def _md_to_pdf_pandoc(md: str, out_path: Path, toc: bool) -> None:
         "--variable=linestretch=1.15",
         "--mathml",
         f"--include-in-header={hdr_path}",
+        f"--include-before-body={before_path}",
     ]
     if toc:
         extra_args.append("--toc")
 
     try:
         pypandoc.convert_text(
-            md,
+            ast if ast is not None else md,
             "pdf",
-            format="markdown+tex_math_single_backslash+tex_math_dollars",
+            format="json" if ast is not None else PANDOC_MD_FORMAT,
             outputfile=str(out_path),
             extra_args=extra_args,
         )
     finally:
         Path(hdr_path).unlink(missing_ok=True)
+        Path(before_path).unlink(missing_ok=True)
 
 def _md_to_pdf_fallback(md: str, out_path: Path, toc: bool) -> None:
     """Converts md string to PDF via markdown-pdf (no TeX required)."""
@@ -82,29 +261,80 @@ def _md_to_pdf_fallback(md: str, out_path: Path, toc: bool) -> None:
     pdf.add_section(Section(md))
     pdf.save(str(out_path))
 
-def md_to_pdf(md: str, out_dir: Path, name: str, toc: bool = False) -> None:
+def _chapters_to_pdf(chapters: list[str], out_path: Path) -> list[int]:
+    """
+    Builds each chapter once on its own, falling back to markdown-pdf only for the chapters that
+    fail to compile, and merges the results into out_path. Returns the indices of fallback chapters.
+
+    LaTeX chapters continue the page numbering of the chapters before them. The merged book has
+    no printed table of contents; the PDF outline of every chapter is combined instead.
+    """
+    fallback: list[int] = []
+    outline: list[list] = []
+    with tempfile.TemporaryDirectory() as tmp, pymupdf.open() as book:
+        for idx, chapter in enumerate(chapters):
+            chapter_path = Path(tmp) / f"chapter-{idx + 1}.pdf"
+            try:
+                _md_to_pdf_pandoc(chapter, chapter_path, False, chapters_to_ast([chapter]), book.page_count + 1)
+            except (OSError, RuntimeError) as exc:
+                logger.warning(f"Chapter {idx + 1} failed to compile with LaTeX, using markdown-pdf for it: {exc}")
+                _md_to_pdf_fallback(chapter, chapter_path, True)
+                fallback.append(idx)
+            with pymupdf.open(str(chapter_path)) as chapter_pdf:
+                entries = chapter_pdf.get_toc(simple=True)
+                top = min((entry[0] for entry in entries), default=1)
+                outline.extend([level - top + 1, title, page + book.page_count] for level, title, page in entries)
+                book.insert_pdf(chapter_pdf)
+        try:
+            book.set_toc(outline)
+        except ValueError as exc:
+            logger.warning(f"Could not combine the chapter outlines: {exc}")
+        book.save(str(out_path))
+    return fallback
+
+def md_to_pdf(
+    md: str,
+    out_dir: Path,
+    name: str,
+    toc: bool = False,
+    ast: str | None = None,
+    chapters: list[str] | None = None,
+) -> None:
     """
     Converts md string to a PDF and saves it to out_dir/name.pdf.
-    Attempts high-quality export via pandoc + LaTeX first; if a TeX engine
-    is not available, falls back to the markdown-pdf library.
+    Attempts high-quality export via pandoc + LaTeX first, reusing ast if provided.
+    If the LaTeX build fails and chapters are provided, each chapter is built once on its own
+    and only the chapters that fail fall back to the markdown-pdf library. Page numbers continue
+    across chapters, but that book has a PDF outline instead of a printed table of contents.
+    If a TeX engine is not available, the whole book falls back to markdown-pdf.
     """
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{name}.pdf"
 
     try:
-        _md_to_pdf_pandoc(md, out_path, toc)
+        _md_to_pdf_pandoc(md, out_path, toc, ast)
+        return
     except (OSError, RuntimeError) as exc:
-        logger.warning(
-            "pandoc PDF export failed (%s). Falling back to markdown-pdf. "
-            "For higher-quality PDFs, install a TeX engine "
-            "(e.g. TeX Live, MiKTeX, or Tectonic).",
-            exc,
-        )
-        _md_to_pdf_fallback(md, out_path, toc)
+        error = exc
+
+    if chapters and shutil.which("xelatex"):
+        logger.warning(f"pandoc PDF export failed ({error}). Building chapters separately.")
+        fallback = _chapters_to_pdf(chapters, out_path)
+        if fallback:
+            logger.warning(f"Used markdown-pdf for chapters {[idx + 1 for idx in fallback]}.")
+        return
+
+    logger.warning(
+        "pandoc PDF export failed (%s). Falling back to markdown-pdf. "
+        "For higher-quality PDFs, install a TeX engine "
+        "(e.g. TeX Live, MiKTeX, or Tectonic).",
+        error,
+    )
+    _md_to_pdf_fallback(md, out_path, toc)
 
-def md_to_epub(md: str, out_dir: Path, name: str, toc: bool = False) -> None:
+def md_to_epub(md: str, out_dir: Path, name: str, toc: bool = False, ast: str | None = None) -> None:
     """
-    Converts md string to an EPUB using pandoc and saves it to out_dir/name.epub
+    Converts md string (or its pre-parsed AST) to an EPUB using pandoc and saves it to out_dir/name.epub
     """
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{name}.epub"
@@ -116,9 +346,9 @@ def md_to_epub(md: str, out_dir: Path, name: str, toc: bool = False) -> None:
         extra_args.append("--toc")
 
     pypandoc.convert_text(
-        md,
+        ast if ast is not None else md,
         "epub3",
-        format="markdown+tex_math_single_backslash+tex_math_dollars",
+        format="json" if ast is not None else PANDOC_MD_FORMAT,
         outputfile=str(out_path),
         extra_args=extra_args,
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,250 @@
+"""
+Module for validating generated Markdown chapters and repairing faulty sections.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+
+import pypandoc
+
+from slides2textbook import llm_tools
+from slides2textbook import prompt_builder as pb
+from slides2textbook.llm_classes import TokenCount
+from slides2textbook.md_helper import PANDOC_MD_FORMAT, math_problems
+
+logger = logging.getLogger(__name__)
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+\S")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_OUTER_FENCE_RE = re.compile(r"\A\s*(```|~~~)[ \t]*(markdown|md)?[ \t]*\n(.*)\n[ \t]*\1[ \t]*\s*\Z", re.DOTALL | re.IGNORECASE)
+_TERMINAL_RE = re.compile(r"[.!?:)\]}\"'”’*_`$|>]$")
+
+@dataclass
+class ValidationIssue:
+    """A single problem found in a chapter, tied to the section it was found in."""
+    kind: str
+    message: str
+    section: int
+
+def split_sections(md: str) -> list[str]:
+    """
+    Split markdown into sections, each starting at a heading (ignoring headings inside code fences).
+    Section 0 holds any text before the first heading. "".join(sections) == md.
+    """
+    sections: list[str] = []
+    current: list[str] = []
+    in_fence = False
+    for line in md.splitlines(keepends=True):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        elif not in_fence and _HEADING_RE.match(line) and (current or sections):
+            sections.append("".join(current))
+            current = []
+        current.append(line)
+    sections.append("".join(current))
+    return sections
+
+def _heading_level(section: str) -> int | None:
+    match = _HEADING_RE.match(section)
+    return len(match.group(1)) if match else None
+
+def check_headings(sections: list[str], is_first: bool) -> list[ValidationIssue]:
+    """
+    Check the heading_hierarchy rule: only the chapter title (and the book title in the
+    first chapter) may use a level 1 or 2 heading, and nested headings must not skip levels.
+    """
+    issues: list[ValidationIssue] = []
+    titles_allowed = 2 if is_first else 1
+    titles_seen = 0
+    previous: int | None = None
+    for idx, section in enumerate(sections):
+        level = _heading_level(section)
+        if level is None:
+            continue
+        if level <= 2:
+            titles_seen += 1
+            if titles_seen > titles_allowed:
+                issues.append(ValidationIssue(
+                    "heading",
+                    f"Section uses a level {level} heading, but '#'/'##' are reserved for the chapter title. Use ### or lower.",
+                    idx,
+                ))
+        elif previous is not None and previous > 2 and level > previous + 1:
+            issues.append(ValidationIssue(
+                "heading",
+                f"Heading skips from level {previous} to level {level}.",
+                idx,
+            ))
+        previous = level
+    return issues
+
+def fix_headings(md: str, is_first: bool = False) -> str:
+    """
+    Demote the extra '#'/'##' headings that check_headings reports to level 3, along with the
+    headings nested under them, so only the chapter title (and the book title in the first
+    chapter) use '#'/'##'. Headings that already follow the rule are left alone. Done locally
+    as it needs no LLM call.
+    """
+    sections = split_sections(md)
+    titles_allowed = 2 if is_first else 1
+    titles_seen = 0
+    demoted_from: int | None = None # Original level of the heading currently being demoted.
+    previous: int | None = None # New level of the previous heading.
+    changed = False
+    for idx, section in enumerate(sections):
+        level = _heading_level(section)
+        if level is None:
+            continue
+        new_level = level
+        if level <= 2:
+            titles_seen += 1
+            demoted_from = level if titles_seen > titles_allowed else None
+            if demoted_from is not None:
+                new_level = 3
+        elif demoted_from is not None:
+            # Keep the nesting under the demoted heading without skipping a level.
+            new_level = min(level - demoted_from + 3, previous + 1, 6)
+        if new_level != level:
+            sections[idx] = "#" * new_level + section[level:]
+            changed = True
+        previous = new_level
+    return "".join(sections) if changed else md
+
+def check_math(section: str) -> list[str]:
+    r"""
+    Return descriptions of unbalanced math delimiters, braces or environments in a section.
+
+    >>> check_math(r"$$\begin{pmatrix} a \\[2pt] b \end{pmatrix}$$")
+    []
+    >>> check_math(r"\(x^{2\)")
+    ['Unbalanced braces in formula: x^{2']
+    >>> check_math(r"Inline $x^{2$ and $20 or $30")
+    ['Unbalanced braces in formula: x^{2']
+    """
+    return math_problems(section)
+
+def check_truncation(md: str) -> str | None:
+    """Return a description if the chapter looks cut off, otherwise None."""
+    in_fence = False
+    for line in md.splitlines():
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+    if in_fence:
+        return "Chapter ends inside an unclosed code block."
+
+    lines = [line.strip() for line in md.splitlines() if line.strip()]
+    if not lines:
+        return "Chapter is empty."
+    last = lines[-1]
+    if _HEADING_RE.match(last):
+        return "Chapter ends with a heading and no content."
+    if re.match(r"^([-*+]|\d+[.)]|>|\|)", last) or last.startswith("```") or last.startswith("~~~") or last == "---":
+        return None
+    if not _TERMINAL_RE.search(last):
+        return "Chapter appears to end mid-sentence."
+    return None
+
+def check_pandoc(md: str) -> str | None:
+    """
+    Dry run the markdown through pandoc's LaTeX writer, returning pandoc's message on failure.
+    The markdown reader never fails outright, so warnings (e.g. an unclosed div or an
+    unparseable formula) are treated as errors.
+    """
+    try:
+        pypandoc.convert_text(md, "latex", format=PANDOC_MD_FORMAT, extra_args=["--fail-if-warnings"])
+    except (OSError, RuntimeError) as exc:
+        return str(exc).strip()
+    return None
+
+def validate_chapter(md: str, is_first: bool = False) -> list[ValidationIssue]:
+    """
+    Run all local checks over a generated chapter and return the issues found, each
+    attributed to the section that should be repaired.
+    """
+    sections = split_sections(md)
+    issues = check_headings(sections, is_first)
+
+    for idx, section in enumerate(sections):
+        for problem in check_math(section):
+            issues.append(ValidationIssue("math", problem, idx))
+
+    truncation = check_truncation(md)
+    if truncation:
+        issues.append(ValidationIssue("truncation", truncation, len(sections) - 1))
+
+    # Only parse per section when the whole chapter fails, so the common case costs one pandoc run.
+    if check_pandoc(md):
+        for idx, section in enumerate(sections):
+            error = check_pandoc(section)
+            if error:
+                issues.append(ValidationIssue("pandoc", f"Pandoc failed to parse section: {error}", idx))
+
+    return issues
+
+def repair_chapter(
+    md: str,
+    issues: list[ValidationIssue],
+    model_str: str = "openai/gpt-5.4",
+    effort: str = None,
+    is_first: bool = False,
+    max_rounds: int = 2,
+) -> tuple[str, TokenCount]:
+    """
+    Repair only the sections with issues. Heading levels are fixed locally; each remaining
+    faulty section is sent to the LLM on its own, then the chapter is re-validated. Returns the repaired chapter and the tokens spent repairing.
+    """
+    token_count = TokenCount()
+    system_prompt = pb.build_repair_prompt()
+
+    if any(issue.kind == "heading" for issue in issues):
+        md = fix_headings(md, is_first)
+        issues = validate_chapter(md, is_first)
+
+    for _ in range(max_rounds):
+        if not issues:
+            break
+        sections = split_sections(md)
+        by_section: dict[int, list[ValidationIssue]] = {}
+        for issue in issues:
+            by_section.setdefault(issue.section, []).append(issue)
+
+        for idx, section_issues in by_section.items():
+            logger.info(f"Repairing section {idx} of chapter: " + "; ".join(i.message for i in section_issues))
+            user_prompt = get_repair_context(sections, idx, section_issues)
+            response = llm_tools.generate(system_prompt, user_prompt, model_str=model_str, effort=effort)
+            token_count.add(response.token_count)
+            separator = "\n\n" if idx < len(sections) - 1 else "\n"
+            sections[idx] = strip_outer_fence(response.output_text).strip("\n") + separator
+
+        md = "".join(sections)
+        issues = validate_chapter(md, is_first)
+
+    for issue in issues:
+        logger.warning(f"Unresolved {issue.kind} issue in section {issue.section}: {issue.message}")
+
+    return md, token_count
+
+def strip_outer_fence(text: str) -> str:
+    """
+    Remove one code fence wrapping the whole text, as models often return markdown inside
+    a ```markdown block, which would otherwise turn the repaired section into a code block.
+    """
+    match = _OUTER_FENCE_RE.match(text)
+    if not match:
+        return text
+    fence, language, inner = match.groups()
+    # Without a markdown info string, only strip when the fences are not two separate code blocks.
+    if not language and any(_FENCE_RE.match(line) for line in inner.splitlines()):
+        return text
+    return inner
+
+def get_repair_context(sections: list[str], idx: int, issues: list[ValidationIssue]) -> str:
+    parts: list[str] = ["Problems found in this section:\n"]
+    parts.extend(f"- {issue.message}\n" for issue in issues)
+    if idx > 0:
+        parts.append("\nEnd of the preceding section (for context only, do not repeat it):\n\n")
+        parts.append(sections[idx - 1][-1000:])
+    parts.append("\n\nSection to repair:\n\n")
+    parts.append(sections[idx])
+    return "".join(parts)
@@ -1,11 +1,133 @@
-
+import hashlib
+import logging
+import os
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
+
+import pymupdf
 import pymupdf4llm as pf
 
-def to_md(path):
-    return pf.to_markdown(
-        str(path),
-        # write_images=False,
-        # image_path=str(images_dir),
-        # image_format="png",
-    )
+logger = logging.getLogger(__name__)
+
+PAGES_PER_SHARD = 16
+CACHE_DIR = Path(os.getenv("SLIDES2TEXTBOOK_CACHE", Path.home() / ".cache" / "slides2textbook")) / "pdf_pages"
+CACHE_MAX_BYTES = int(os.getenv("SLIDES2TEXTBOOK_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+def to_md(path) -> str:
+    """
+    Decode a PDF to markdown. Pages are decoded in parallel shards and cached, see iter_pages.
+    """
+    return "".join(iter_pages(path))
+
+def iter_pages(path, max_workers: int | None = None) -> Iterator[str]:
+    """
+    Yield the markdown of each page of a PDF in order, holding only the pages of the shard being
+    handed out in memory.
+
+    Each page is cached under CACHE_DIR by a hash of its content and of the document's header
+    levels, so an edited PDF only re-decodes the pages that changed (or every page, if the edit
+    changes which font sizes are headings). The least recently used pages are pruned once the
+    cache exceeds CACHE_MAX_BYTES. Uncached pages are split into shards of
+    PAGES_PER_SHARD pages and decoded across a process pool.
+    """
+    path = Path(path)
+    with pymupdf.open(str(path)) as doc:
+        # Headers are identified once over the whole document so heading levels agree across shards.
+        # The decoded markdown depends on them, so they are part of every page's cache key.
+        hdr_info = pf.IdentifyHeaders(doc)
+        hdr_digest = _headers_digest(hdr_info)
+        keys = [_page_key(page, hdr_digest) for page in doc]
+
+    missing = [idx for idx, key in enumerate(keys) if not (CACHE_DIR / f"{key}.md").is_file()]
+    if missing:
+        logger.debug(f"Decoding {len(missing)} of {len(keys)} pages of {path}.")
+    shards = _shards(missing)
+    shard_of = {idx: shard for shard in shards for idx in shard}
+    decoded: dict[int, str] = {}
+
+    # A single shard is decoded in this process when it is reached, without starting a pool.
+    pool = ProcessPoolExecutor(max_workers=max_workers or min(len(shards), os.cpu_count() or 1)) if len(shards) > 1 else None
+    with pool or nullcontext():
+        futures: dict[int, Future] = {}
+        if pool is not None:
+            futures = {shard[0]: pool.submit(_decode_pages, str(path), shard, hdr_info) for shard in shards}
+
+        for idx, key in enumerate(keys):
+            if idx in shard_of and idx not in decoded:
+                shard = shard_of[idx]
+                texts = futures[shard[0]].result() if pool is not None else _decode_pages(str(path), shard, hdr_info)
+                for page_idx, text in zip(shard, texts):
+                    decoded[page_idx] = text
+                    _write_cache(keys[page_idx], text)
+            text = decoded.pop(idx, None)
+            if text is None:
+                text = _read_cache(key)
+            if text is None: # Pruned by another run since the lookup above.
+                text = _decode_pages(str(path), [idx], hdr_info)[0]
+                _write_cache(key, text)
+            yield text
+    _prune_cache()
+
+def _decode_pages(path: str, pages: list[int], hdr_info) -> list[str]:
+    chunks = pf.to_markdown(path, pages=pages, page_chunks=True, hdr_info=hdr_info)
+    return [chunk["text"] for chunk in chunks]
+
+def _shards(pages: list[int]) -> list[list[int]]:
+    """Split sorted page indices into runs of consecutive pages of at most PAGES_PER_SHARD."""
+    shards: list[list[int]] = []
+    for idx in pages:
+        if shards and idx == shards[-1][-1] + 1 and len(shards[-1]) < PAGES_PER_SHARD:
+            shards[-1].append(idx)
+        else:
+            shards.append([idx])
+    return shards
+
+def _headers_digest(hdr_info) -> str:
+    header_id = getattr(hdr_info, "header_id", {})
+    body_limit = getattr(hdr_info, "body_limit", None)
+    return hashlib.sha256(repr((sorted(header_id.items()), body_limit)).encode()).hexdigest()
+
+def _page_key(page: pymupdf.Page, hdr_digest: str) -> str:
+    digest = hashlib.sha256(pf.version.encode())
+    digest.update(hdr_digest.encode())
+    digest.update(page.read_contents())
+    digest.update(page.get_text().encode("utf-8"))
+    return digest.hexdigest()
+
+def _read_cache(key: str) -> str | None:
+    path = CACHE_DIR / f"{key}.md"
+    try:
+        text = path.read_text(encoding="utf-8")
+        os.utime(path) # Mark as recently used for _prune_cache.
+        return text
+    except OSError:
+        return None
+
+def _write_cache(key: str, text: str) -> None:
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        (CACHE_DIR / f"{key}.md").write_text(text, encoding="utf-8")
+    except OSError as exc:
+        logger.debug(f"Could not cache decoded page: {exc}")
+
+def _prune_cache() -> None:
+    """Delete the least recently used cached pages until the cache fits in CACHE_MAX_BYTES."""
+    try:
+        entries = [(entry.stat(), entry) for entry in CACHE_DIR.glob("*.md")]
+        total = sum(stat.st_size for stat, _ in entries)
+        for stat, entry in sorted(entries, key=lambda item: item[0].st_mtime):
+            if total <= CACHE_MAX_BYTES:
+                break
+            entry.unlink(missing_ok=True)
+            total -= stat.st_size
+    except OSError as exc:
+        logger.debug(f"Could not prune page cache: {exc}")
+
+def to_text(path) -> tuple[str, int]:
+    """
+    Cheap plain text extraction without layout analysis, used for estimates. Returns (text, page count).
+    """
+    with pymupdf.open(str(path)) as doc:
+        return "".join(page.get_text() for page in doc), doc.page_count
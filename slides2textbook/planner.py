@@ -0,0 +1,278 @@
+"""
+Module for estimating the tokens, cost and time of a run before any API is called.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from slides2textbook import context_loader, pdf_decoder
+from slides2textbook import prompt_builder as pb
+from slides2textbook.llm_classes import PREVIEW_WORKERS
+from slides2textbook.llm_tools import determine_model
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# List prices in USD per 1M tokens as (input, output), matched on the exact model name.
+# Dated snapshots and preview/latest aliases (e.g. "gpt-5-mini-2025-08-07") use the price of
+# their base name. Models with a newer minor version than listed (e.g. "gpt-5.4") use the price
+# of the nearest listed version below it, shown as approximate. Anything else, including other
+# variants such as "gpt-5-pro", is shown without a cost.
+MODEL_PRICING: dict[str, tuple[float, float]] = {
+    "gpt-5": (1.25, 10.00),
+    "gpt-5-mini": (0.25, 2.00),
+    "gpt-5-nano": (0.05, 0.40),
+    "gpt-5.1": (1.25, 10.00),
+    "gpt-5.2": (1.75, 14.00),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-3-pro": (2.00, 12.00),
+    "gemini-3-flash": (0.50, 3.00),
+}
+
+# Reasoning tokens billed as output per call, by effort. None uses the provider default.
+EFFORT_REASONING_TOKENS: dict[str | None, int] = {
+    None: 6000,
+    "none": 0,
+    "minimal": 500,
+    "low": 2000,
+    "medium": 6000,
+    "high": 15000,
+}
+
+CHAPTER_OUTPUT_TOKENS = 7000 # Typical generated chapter length, see examples/.
+CHAPTER_OUTPUT_RATIO = 0.2
+CHAPTER_OUTPUT_MAX_TOKENS = 32000
+IMAGE_INPUT_TOKENS = 1500
+IMAGE_OUTPUT_TOKENS = 400
+OUTPUT_TOKENS_PER_SECOND = 60
+CALL_LATENCY_SECONDS = 3.0
+
+@dataclass
+class ChapterPlan:
+    number: int
+    files: int
+    pages: int
+    images: int
+    prompt_tokens: int
+    draft_prompt_tokens: int
+    output_tokens: int
+    cached: bool
+    draft_cached: bool
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, otherwise estimate at ~4 characters per token."""
+    if tiktoken is not None:
+        return len(tiktoken.get_encoding("o200k_base").encode(text, disallowed_special=()))
+    return len(text) // 4
+
+_ALIAS_SUFFIX_RE = re.compile(r"(-(\d{4}-\d{2}-\d{2}|\d{2}-\d{4}|preview|latest|exp))+$")
+_VERSION_RE = re.compile(r"^(.*?-)(\d+)(?:\.(\d+))?(-.*)?$")
+
+def price_for(model_str: str) -> tuple[tuple[float, float], bool] | None:
+    """
+    Return the (input, output) price of a model and whether it is approximate, or None if unknown.
+    """
+    name = _ALIAS_SUFFIX_RE.sub("", determine_model(model_str))
+    if name in MODEL_PRICING:
+        return MODEL_PRICING[name], False
+
+    # Fall back to the nearest listed version at or below the requested one with the same variant,
+    # e.g. "gpt-5.4" -> "gpt-5.2", "gpt-5.4-mini" -> "gpt-5-mini".
+    match = _VERSION_RE.match(name)
+    if match is None:
+        return None
+    prefix, major, minor, variant = match.groups()
+    requested = (int(major), int(minor or 0))
+    best: tuple[tuple[int, int], str] | None = None
+    for listed in MODEL_PRICING:
+        listed_match = _VERSION_RE.match(listed)
+        if listed_match is None:
+            continue
+        listed_prefix, listed_major, listed_minor, listed_variant = listed_match.groups()
+        version = (int(listed_major), int(listed_minor or 0))
+        if (listed_prefix, listed_variant, version[0]) != (prefix, variant, requested[0]) or version > requested:
+            continue
+        if best is None or version > best[0]:
+            best = (version, listed)
+    if best is None:
+        return None
+    return MODEL_PRICING[best[1]], best[0] != requested
+
+def estimate_cost(model_str: str, input_tokens: int, output_tokens: int) -> tuple[float, bool] | None:
+    """Return the estimated cost and whether it is based on an approximate price, or None if unknown."""
+    match = price_for(model_str)
+    if match is None:
+        return None
+    price, approximate = match
+    return (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000, approximate
+
+def estimate_seconds(output_tokens: int) -> float:
+    return CALL_LATENCY_SECONDS + output_tokens / OUTPUT_TOKENS_PER_SECOND
+
+def plan_run(path: Path, out_dir: Path) -> list[ChapterPlan]:
+    """
+    Walk the input tree the same way load_main_directory does and estimate every chapter
+    prompt locally. PDFs are read with a cheap text extraction and images are not transcribed.
+    Output tokens exclude reasoning, which depends on the effort and is added by format_plan.
+    """
+    system_tokens = count_tokens(pb.build_system_prompt())
+    instructions = context_loader.load_instructions(path)
+    instruction_tokens = count_tokens(instructions) if instructions else 0
+
+    plans: list[ChapterPlan] = []
+    previous_tokens = 0
+    for idx, files in enumerate(context_loader.list_chapter_files(path)):
+        pages = 0
+        images = 0
+        context_tokens = 0
+        for file in files:
+            if file.name == "textbook_instructions.txt":
+                continue
+            match file.suffix:
+                case ".pdf":
+                    text, page_count = pdf_decoder.to_text(file)
+                    pages += page_count
+                    context_tokens += count_tokens(text)
+                case ".txt" | ".md" | ".json" | ".html":
+                    context_tokens += count_tokens(context_loader.load_textfile(file))
+                case ".png" | ".jpg" | ".jpeg":
+                    images += 1
+                    context_tokens += IMAGE_OUTPUT_TOKENS
+                case _:
+                    logger.warning(f"Unsupported filetype {file} would abort the run.")
+
+        cached_path = out_dir / "chapters" / f"chapter-{idx + 1}.md"
+        cached = cached_path.is_file()
+        if cached:
+            output_tokens = count_tokens(context_loader.load_textfile(cached_path))
+        else:
+            output_tokens = min(max(CHAPTER_OUTPUT_TOKENS, int(context_tokens * CHAPTER_OUTPUT_RATIO)), CHAPTER_OUTPUT_MAX_TOKENS)
+
+        plans.append(ChapterPlan(
+            number=idx + 1,
+            files=len(files),
+            pages=pages,
+            images=images,
+            prompt_tokens=system_tokens + instruction_tokens + previous_tokens + context_tokens,
+            draft_prompt_tokens=system_tokens + instruction_tokens + context_tokens,
+            output_tokens=output_tokens,
+            cached=cached,
+            draft_cached=(out_dir / "drafts" / f"chapter-{idx + 1}.md").is_file(),
+        ))
+        previous_tokens = output_tokens
+
+    return plans
+
+def _format_cost(cost: tuple[float, bool] | None) -> str:
+    if cost is None:
+        return "n/a"
+    value, approximate = cost
+    return f"{'~' if approximate else ''}${value:,.2f}"
+
+def _format_time(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m{seconds:02d}s"
+
+def _add_cost(total: tuple[float, bool] | None, cost: tuple[float, bool] | None) -> tuple[float, bool] | None:
+    if total is None or cost is None:
+        return None
+    return total[0] + cost[0], total[1] or cost[1]
+
+def format_plan(
+    plans: list[ChapterPlan],
+    model_str: str,
+    vision_model: str,
+    effort: str | None = None,
+    preview: bool = False,
+    preview_model: str | None = None,
+    preview_effort: str | None = "low",
+    validate: bool = True,
+) -> str:
+    """Render the plan as a plain text table with per chapter and total estimates."""
+    reasoning_tokens = EFFORT_REASONING_TOKENS.get(effort, EFFORT_REASONING_TOKENS[None])
+    header = f"{'Chapter':>7} {'Files':>5} {'Pages':>5} {'Images':>6} {'Prompt tok':>10} {'Output tok':>10} {'Cost':>9} {'Time':>8}  Status"
+    lines = [
+        f"Plan for model={model_str} effort={effort} vision-model={vision_model} "
+        f"(tokenizer: {'tiktoken' if tiktoken is not None else '~4 chars/token'})",
+        header,
+        "-" * len(header),
+    ]
+
+    def row(label, files, pages, images, input_tokens, output_tokens, cost, seconds, status=""):
+        lines.append(
+            f"{label:>7} {files:>5} {pages:>5} {images:>6} {input_tokens:>10,} {output_tokens:>10,} "
+            f"{_format_cost(cost):>9} {_format_time(seconds):>8}  {status}".rstrip()
+        )
+
+    total_cost: tuple[float, bool] | None = (0.0, False)
+    total_seconds = 0.0
+    total_input = 0
+    total_output = 0
+
+    # Images are transcribed while loading, even for chapters that are already cached.
+    images = sum(plan.images for plan in plans)
+    if images:
+        image_input, image_output = images * IMAGE_INPUT_TOKENS, images * IMAGE_OUTPUT_TOKENS
+        image_cost = estimate_cost(vision_model, image_input, image_output)
+        image_seconds = images * estimate_seconds(IMAGE_OUTPUT_TOKENS)
+        total_cost = _add_cost(total_cost, image_cost)
+        total_seconds += image_seconds
+        total_input += image_input
+        total_output += image_output
+
+    if preview:
+        drafts = [plan for plan in plans if not plan.cached and not plan.draft_cached]
+        draft_model = preview_model or model_str
+        draft_reasoning = EFFORT_REASONING_TOKENS.get(preview_effort, EFFORT_REASONING_TOKENS[None])
+        draft_input = sum(plan.draft_prompt_tokens for plan in drafts)
+        draft_output = sum(plan.output_tokens + draft_reasoning for plan in drafts)
+        draft_cost = estimate_cost(draft_model, draft_input, draft_output)
+        # Drafts run in parallel batches, so each batch takes as long as its longest chapter.
+        draft_seconds = sum(
+            max(estimate_seconds(plan.output_tokens + draft_reasoning) for plan in drafts[start:start + PREVIEW_WORKERS])
+            for start in range(0, len(drafts), PREVIEW_WORKERS)
+        )
+        total_cost = _add_cost(total_cost, draft_cost)
+        total_seconds += draft_seconds
+        total_input += draft_input
+        total_output += draft_output
+
+    for plan in plans:
+        if plan.cached:
+            row(plan.number, plan.files, plan.pages, plan.images, plan.prompt_tokens, plan.output_tokens, (0.0, False), 0.0, "cached")
+            continue
+        output_tokens = plan.output_tokens + reasoning_tokens
+        cost = estimate_cost(model_str, plan.prompt_tokens, output_tokens)
+        seconds = estimate_seconds(output_tokens)
+        total_cost = _add_cost(total_cost, cost)
+        total_seconds += seconds
+        total_input += plan.prompt_tokens
+        total_output += output_tokens
+        row(plan.number, plan.files, plan.pages, plan.images, plan.prompt_tokens, output_tokens, cost, seconds, "generate")
+
+    if images:
+        row("images", "", "", images, image_input, image_output, image_cost, image_seconds, "transcribe")
+    if preview:
+        row("drafts", "", "", "", draft_input, draft_output, draft_cost, draft_seconds, f"draft {len(drafts)} chapters with {draft_model}")
+
+    lines.append("-" * len(header))
+    row("total", sum(p.files for p in plans), sum(p.pages for p in plans), images, total_input, total_output, total_cost, total_seconds)
+    lines.append(
+        f"{sum(p.cached for p in plans)} of {len(plans)} chapters cached. "
+        "Chapters are generated in order as each prompt includes the previous chapter."
+    )
+    if total_cost is not None and total_cost[1]:
+        lines.append("Costs marked ~ use the price of an older version of the model and are approximate.")
+    if validate:
+        lines.append("Repair calls for chapters that fail validation are not estimated (disable with --no-validate).")
+    return "\n".join(lines)
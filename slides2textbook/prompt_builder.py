@@ -15,6 +15,14 @@ def build_system_prompt(keys: Sequence[str] | None = None) -> str:
     return "\n".join(f"- {text}" for _, text in items)
 
 
+def build_repair_prompt() -> str:
+    """
+    Build the system/developer prompt used to repair a single faulty section of a chapter.
+    Includes the formatting rules the section must follow so a repair does not introduce new issues.
+    """
+    rules = {**REPAIR_RULES, "heading_hierarchy": RULES["heading_hierarchy"]}
+    return "\n".join(f"- {text}" for text in rules.values())
+
 def available_rule_keys() -> list[str]:
     return list(RULES.keys())
 
@@ -45,3 +53,14 @@ RULES: dict[str, str] = {
     "no_preamble": "Do not start with a preamble; begin the textbook chapter immediately.",
     "heading_hierarchy": "Use ## only for the chapter title. Use ### or lower for sections within a chapter.",
 }
+
+REPAIR_RULES: dict[str, str] = {
+    "role": (
+        "You are a textbook editor. You are given one section of a textbook chapter together with a list of problems "
+        "found in it by an automated checker. Fix those problems."
+    ),
+    "minimal": "Change only what is needed to fix the listed problems. Keep the wording, content and structure otherwise identical.",
+    "complete": "If the section is cut off, finish it naturally in the same style without starting new topics.",
+    "math": "Use LaTeX with balanced delimiters (\\( \\) for inline, \\[ \\] or $$ $$ for display) and balanced braces.",
+    "section_only": "Respond only with the repaired section in Markdown, starting with its heading if it has one. Do not output anything else.",
+}
@@ -0,0 +1,165 @@
+"""
+Module for watching the input directory and rebuilding only the chapters affected by a change.
+"""
+
+import logging
+import time
+from pathlib import Path
+
+from slides2textbook import context_loader
+
+logger = logging.getLogger(__name__)
+
+RETRY_SECONDS = 30.0
+
+def snapshot(path: Path, exclude: Path | None = None) -> dict[Path, tuple[int, int]]:
+    """
+    Return the modification time and size of every context file under path, skipping files under
+    exclude and files that are not context (see context_loader.is_context_file), such as editor temp files.
+    """
+    exclude = exclude.resolve() if exclude else None
+    state: dict[Path, tuple[int, int]] = {}
+    for file in path.rglob("*"):
+        if (exclude and file.resolve().is_relative_to(exclude)) or not context_loader.is_context_file(file):
+            continue
+        try:
+            if file.is_file():
+                stat = file.stat()
+                state[file] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            continue # File removed while scanning, picked up on the next poll.
+    return state
+
+def changed_files(before: dict[Path, tuple[int, int]], after: dict[Path, tuple[int, int]]) -> set[Path]:
+    """Return the files that were added, removed or modified between two snapshots."""
+    return {file for file in before.keys() | after.keys() if before.get(file) != after.get(file)}
+
+def affected_chapters(old_chapters: list[list[Path]], new_chapters: list[list[Path]], changed: set[Path]) -> list[int]:
+    """
+    Map changed files to chapter indices. A chapter is affected when any of its files changed or
+    its set of files differs from before. The following chapter is also affected, since its
+    prompt includes the previous chapter.
+    """
+    affected: set[int] = set()
+    for idx, files in enumerate(new_chapters):
+        old_files = old_chapters[idx] if idx < len(old_chapters) else None
+        if files != old_files or any(file in changed for file in files):
+            affected.add(idx)
+            if idx + 1 < len(new_chapters):
+                affected.add(idx + 1)
+    return sorted(affected)
+
+def watch(
+    path: Path,
+    out_dir: Path,
+    name: str,
+    save_md: bool,
+    make_pdf: bool,
+    make_epub: bool,
+    model: str,
+    effort: str,
+    vision_model: str = "openai/gpt-5.4",
+    validate: bool = True,
+    interval: float = 2.0,
+    state: dict[Path, tuple[int, int]] | None = None,
+    chapters: list[list[Path]] | None = None,
+) -> None:
+    """
+    Poll the input directory and, whenever files change, re-decode, regenerate and re-export only
+    the affected chapters. Runs until interrupted. Expects run_pipeline to have built every chapter.
+    A failed rebuild is retried after RETRY_SECONDS.
+
+    state and chapters are the snapshot and chapter files the last build was made from. Pass the
+    ones taken before run_pipeline started so edits made during the build are picked up; they
+    default to the current input directory.
+    """
+    if state is None:
+        state = snapshot(path, out_dir)
+    if chapters is None:
+        chapters = context_loader.list_chapter_files(path, skip_unsupported=True)
+    retry_at = 0.0
+    logger.info(f"Watching {path} for changes every {interval}s. Press Ctrl+C to stop.")
+
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot(path, out_dir)
+            if current == state or time.monotonic() < retry_at:
+                continue
+            # Wait for the files to settle so a save in progress is not read half written.
+            time.sleep(interval)
+            if snapshot(path, out_dir) != current:
+                continue
+
+            changed = changed_files(state, current)
+            new_chapters = context_loader.list_chapter_files(path, skip_unsupported=True)
+            if path / "textbook_instructions.txt" in changed:
+                affected = list(range(len(new_chapters)))
+            else:
+                affected = affected_chapters(chapters, new_chapters, changed)
+
+            # A removed chapter regenerates nothing but still needs its stale file removed and a re-export.
+            if affected or len(new_chapters) != len(chapters):
+                logger.info(f"Detected {len(changed)} changed file(s), rebuilding chapters {[idx + 1 for idx in affected]}.")
+                try:
+                    rebuild(path, out_dir, name, new_chapters, affected, save_md, make_pdf, make_epub, model, effort, vision_model, validate)
+                except (Exception, SystemExit):
+                    # SystemExit is raised by context_loader for a file it cannot load.
+                    # Keep the previous state so the same changes are picked up again on retry.
+                    logger.exception(f"Failed to rebuild textbook, retrying in {RETRY_SECONDS}s.")
+                    retry_at = time.monotonic() + RETRY_SECONDS
+                    continue
+
+            state = current
+            chapters = new_chapters
+    except KeyboardInterrupt:
+        logger.info("Stopped watching.")
+
+def rebuild(
+    path: Path,
+    out_dir: Path,
+    name: str,
+    chapters: list[list[Path]],
+    affected: list[int],
+    save_md: bool,
+    make_pdf: bool,
+    make_epub: bool,
+    model: str,
+    effort: str,
+    vision_model: str = "openai/gpt-5.4",
+    validate: bool = True,
+) -> None:
+    """
+    Regenerate the affected chapters in order, reusing every other chapter from out_dir/chapters,
+    then re-export the textbook.
+    """
+    from slides2textbook import llm_tools, md_helper, prompt_builder as pb
+    from slides2textbook.main import generate_chapter, get_chapter_context, save_files
+
+    chapters_dir = out_dir / "chapters"
+    textbook: list[str] = []
+    for idx in range(len(chapters)):
+        chapter_path = chapters_dir / f"chapter-{idx + 1}.md"
+        textbook.append(context_loader.load_textfile(chapter_path) if chapter_path.is_file() else "")
+
+    # Remove chapters left over from a removed chapter so a later run does not reuse them.
+    for stale in chapters_dir.glob("chapter-*.md"):
+        number = stale.stem.removeprefix("chapter-")
+        if number.isdigit() and int(number) > len(chapters):
+            stale.unlink()
+
+    instructions = context_loader.load_instructions(path)
+    system_prompt = pb.build_system_prompt()
+    token_count = llm_tools.TokenCount()
+
+    for idx in affected:
+        chapter_context = context_loader.load_context(chapters[idx], vision_model=vision_model)
+        chapter_prompt = get_chapter_context(chapter_context, instructions, idx, textbook, name)
+        chapter, chapter_token_count = generate_chapter(system_prompt, chapter_prompt, idx, model, effort, validate)
+        token_count.add(chapter_token_count)
+        textbook[idx] = chapter
+        md_helper.save_md(chapter, chapters_dir, f"chapter-{idx + 1}")
+        logger.info(f"Regenerated chapter {idx + 1}.")
+
+    logger.info(token_count)
+    save_files(textbook, out_dir, name, save_md, make_pdf, make_epub)
@@ -0,0 +1,82 @@
+from slides2textbook.md_validator import (
+    check_headings,
+    check_math,
+    check_truncation,
+    fix_headings,
+    split_sections,
+    strip_outer_fence,
+)
+
+def _levels(md: str) -> list[int]:
+    return [len(line) - len(line.lstrip("#")) for line in md.splitlines() if line.startswith("#")]
+
+def test_split_sections_roundtrip():
+    md = "Intro\n## Ch\nText\n```\n# not a heading\n```\n### A\nMore\n"
+    sections = split_sections(md)
+    assert "".join(sections) == md
+    assert len(sections) == 3
+
+def test_check_headings_accepts_valid_chapter():
+    md = "## Ch\n\n### Intro\n\n#### Detail\n\n### Summary\n"
+    assert check_headings(split_sections(md), is_first=False) == []
+
+def test_check_headings_allows_book_title_in_first_chapter():
+    md = "# Book\n\n## Ch\n\n### Intro\n"
+    assert check_headings(split_sections(md), is_first=True) == []
+    assert [issue.section for issue in check_headings(split_sections(md), is_first=False)] == [1]
+
+def test_check_headings_reports_extra_titles_and_skips():
+    md = "## Ch\n\n### A\n\n##### Deep\n\n## Bad\n"
+    issues = check_headings(split_sections(md), is_first=False)
+    assert [(issue.kind, issue.section) for issue in issues] == [("heading", 2), ("heading", 3)]
+
+def test_fix_headings_leaves_correct_headings_alone():
+    md = "## Ch\n\n### Intro\n\n### Details\n\n## Summary\n"
+    fixed = fix_headings(md)
+    assert _levels(fixed) == [2, 3, 3, 3]
+    assert check_headings(split_sections(fixed), is_first=False) == []
+
+def test_fix_headings_does_not_introduce_skips():
+    md = "## Ch\n\n### A\n\n## Bad\n\n#### deep\n"
+    fixed = fix_headings(md)
+    assert _levels(fixed) == [2, 3, 3, 4]
+    assert check_headings(split_sections(fixed), is_first=False) == []
+
+def test_fix_headings_keeps_nesting_under_demoted_headings():
+    md = "# Ch\n\n## A\n\n### a1\n\n## B\n\nText\n"
+    fixed = fix_headings(md)
+    assert _levels(fixed) == [1, 3, 4, 3]
+    assert fixed.endswith("### B\n\nText\n")
+
+def test_fix_headings_keeps_book_title_in_first_chapter():
+    md = "# Book\n\n## Ch\n\n## A\n"
+    assert _levels(fix_headings(md, is_first=True)) == [1, 2, 3]
+
+def test_fix_headings_returns_valid_chapter_unchanged():
+    md = "## Ch\n\n### A\n\n#### b\n"
+    assert fix_headings(md) is md
+
+def test_check_truncation_accepts_complete_chapter():
+    assert check_truncation("## Ch\n\nA full sentence.\n") is None
+    assert check_truncation("## Ch\n\n- a list item\n") is None
+
+def test_check_truncation_detects_cut_off_chapters():
+    assert check_truncation("") == "Chapter is empty."
+    assert check_truncation("## Ch\n\nText.\n\n### Next\n") == "Chapter ends with a heading and no content."
+    assert check_truncation("## Ch\n\n```python\nx = 1\n") == "Chapter ends inside an unclosed code block."
+    assert check_truncation("## Ch\n\nThis sentence stops in the") == "Chapter appears to end mid-sentence."
+
+def test_strip_outer_fence():
+    assert strip_outer_fence("```markdown\n### A\n\nText.\n```\n") == "### A\n\nText."
+    assert strip_outer_fence("```\n### A\n\nText.\n```") == "### A\n\nText."
+    assert strip_outer_fence("```markdown\n### A\n\n```python\nx = 1\n```\n```") == "### A\n\n```python\nx = 1\n```"
+    assert strip_outer_fence("### A\n\nText.\n") == "### A\n\nText.\n"
+    two_blocks = "```\nx = 1\n```\n\nText.\n\n```\ny = 2\n```"
+    assert strip_outer_fence(two_blocks) == two_blocks
+
+def test_check_math_finds_inline_dollar_math():
+    assert check_math("Inline $x^{2$ bad") == ["Unbalanced braces in formula: x^{2"]
+    assert check_math("Inline $x^{2}$ fine") == []
+    assert check_math("Costs of $20 and $30 are not math.") == []
+    assert check_math("Escaped \\$x^{$ is not math.") == []
+    assert check_math("$x^{2\n\ny$") == []